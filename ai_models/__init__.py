@@ -0,0 +1,7 @@
+"""AI models for report analysis."""
+
+from .image_analyzer import ImageAnalyzer
+from .spam_detector import SpamDetector
+from .text_analyzer import TextAnalyzer
+
+__all__ = ["ImageAnalyzer", "SpamDetector", "TextAnalyzer"]
@@ -0,0 +1,591 @@
+"""Image analyzer backed by YOLOv8 object detection.
+
+Scores uploaded report media for violence/emergency severity on a 0-10
+scale. Falls back to cheap image heuristics when the model stack is not
+available on the host.
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    xxhash = None
+    XXHASH_AVAILABLE = False
+
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    diskcache = None
+    DISKCACHE_AVAILABLE = False
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    cv2 = None
+    np = None
+    CV2_AVAILABLE = False
+
+try:
+    from ultralytics import YOLO
+    YOLO_AVAILABLE = True
+except ImportError:
+    YOLO = None
+    YOLO_AVAILABLE = False
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    torch = None
+    TORCH_AVAILABLE = False
+
+# Largest batch the exported engine is built for.
+MAX_BATCH = 8
+
+# Engine precision: int8 needs a calibration set, fp16 is the default on
+# CUDA, fp32 skips the TensorRT export entirely.
+AI_PRECISION = os.environ.get('AI_PRECISION', 'fp16').lower()
+
+# Representative disaster images used for INT8 calibration.
+CALIB_DATA = os.environ.get('CALIB_DATA', 'models/calib/calib.yaml')
+
+# How long the micro-batcher waits for more images before running the
+# batch it has.
+BATCH_WAIT_MS = float(os.environ.get('BATCH_WAIT_MS', '20'))
+
+
+class _MicroBatcher:
+    """Coalesces images from concurrent requests into one GPU batch.
+
+    Handlers submit single images and get a Future back; a consumer
+    thread drains the queue, waiting up to BATCH_WAIT_MS for the batch
+    to fill, runs one forward pass, and resolves each Future with its
+    slice of the results. Amortizes kernel-launch and weight-read costs
+    across requests that arrive within the window.
+    """
+
+    def __init__(self, analyzer, max_batch=MAX_BATCH, max_wait_ms=BATCH_WAIT_MS):
+        self._analyzer = analyzer
+        self._queue = queue.Queue()
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        fut = Future()
+        self._queue.put((image, fut))
+        return fut
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            images = [image for image, _ in batch]
+            try:
+                scores = self._analyzer._infer_scores(images)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), score in zip(batch, scores):
+                fut.set_result(score)
+
+
+class ImageAnalyzer:
+    """Analyzes report media with YOLOv8 and maps detections to a severity score."""
+
+    def __init__(self):
+        self.model = None
+
+        # Long-lived Ultralytics predictor plus reusable pinned-host and
+        # device buffers, so batches don't pay predictor setup and
+        # cudaMalloc/cudaFree on every call.
+        self.predictor = None
+        self._host_pinned = None
+        self._dev_buf = None
+        # The buffers are shared mutable state; with MICRO_BATCH=0 the
+        # app's thread pool calls analyze_batch concurrently, so the
+        # fill + forward must not interleave across requests.
+        self._infer_lock = threading.Lock()
+
+        # Cross-request micro-batcher; built once the model is loaded.
+        self._batcher = None
+
+        # Decodes and preprocesses the next images on CPU while the GPU
+        # is busy inferring the current batch.
+        self._preproc_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+        # Severity scores keyed by image content hash, so re-uploads of
+        # the same media (retries, report edits) skip inference entirely.
+        self._score_cache = OrderedDict()
+        self._score_cache_size = 1024
+        self._disk_cache = None
+        if DISKCACHE_AVAILABLE:
+            try:
+                cache_dir = os.path.join(
+                    os.environ.get('UPLOAD_FOLDER', 'uploads'), '.cache'
+                )
+                self._disk_cache = diskcache.Cache(cache_dir)
+            except Exception as e:
+                logger.warning(f"Could not open disk cache: {e}")
+
+        # Object classes that indicate violence or an emergency, by severity tier.
+        self.violence_objects = {
+            'high': ['knife', 'gun', 'pistol', 'rifle', 'weapon'],
+            'medium': ['fire', 'smoke', 'car', 'truck', 'motorcycle'],
+            'low': ['person', 'crowd', 'backpack', 'bottle'],
+        }
+
+        # Class name -> severity weight, precomputed so scoring is one
+        # dict lookup per detection instead of scanning every tier list.
+        # Tier priority: a class listed in several tiers keeps the
+        # highest weight. YOLO's class vocabulary is fixed, so exact
+        # names are enough.
+        self._class_weights = {}
+        for tier, weight in (('low', 1.0), ('medium', 2.5), ('high', 5.0)):
+            for name in self.violence_objects[tier]:
+                self._class_weights[name] = weight
+
+        self._load_model()
+
+    def _load_model(self):
+        """Load the YOLOv8 detection model."""
+        if not YOLO_AVAILABLE:
+            logger.warning("ultralytics not available, using fallback image scoring")
+            return
+
+        try:
+            model_path = os.environ.get('MODEL_PATH', 'yolov8n.pt')
+            model_path = self._maybe_export_engine(model_path)
+            self.model = YOLO(model_path)
+            logger.info(f"Loaded YOLO model from {model_path}")
+            self._half_if_cuda(model_path)
+            self._maybe_compile(model_path)
+            self._init_predictor()
+            if os.environ.get('MICRO_BATCH', '1') != '0':
+                self._batcher = _MicroBatcher(self)
+        except Exception as e:
+            logger.error(f"Failed to load YOLO model: {e}")
+            self.model = None
+
+    def _half_if_cuda(self, model_path):
+        """Run the raw PyTorch weights in FP16 on CUDA hosts.
+
+        Applies when the TensorRT export didn't happen (AI_PRECISION=
+        fp32, export failure): fused FP16 still gets tensor-core GEMMs
+        at ~2x FP32 throughput and half the memory traffic. CPU hosts
+        stay FP32 — FP16 arithmetic is slow there.
+        """
+        if not model_path.endswith('.pt'):
+            return
+        if not (TORCH_AVAILABLE and torch.cuda.is_available()):
+            return
+        if AI_PRECISION == 'fp32':
+            return
+
+        try:
+            self.model.fuse()
+            self.model.model.half().to('cuda')
+            # Without half=True the predictor's AutoBackend defaults to
+            # fp16=False and casts the module back to float32 on the
+            # first predict(), silently undoing the cast above.
+            self.model.overrides['half'] = True
+            logger.info("Running YOLO in FP16 on CUDA")
+        except Exception as e:
+            logger.warning(f"FP16 conversion failed, staying FP32: {e}")
+
+    def _maybe_compile(self, model_path):
+        """Lower the PyTorch forward pass with TorchInductor.
+
+        Covers hosts where the TensorRT export isn't an option (e.g.
+        non-NVIDIA GPUs): kernel fusion and CUDA-graph capture remove
+        per-op launch overhead, the dominant cost for a model this
+        small. Needs torch>=2.1; the dummy forward in _init_predictor
+        triggers compilation at load time rather than on the first
+        request. TORCH_COMPILE=0 opts out.
+        """
+        if not model_path.endswith('.pt'):
+            return
+        if not (TORCH_AVAILABLE and hasattr(torch, 'compile')):
+            return
+        if os.environ.get('TORCH_COMPILE', '1') == '0':
+            return
+        try:
+            major, minor = (int(v) for v in torch.__version__.split('.')[:2])
+            if (major, minor) < (2, 1):
+                return
+        except ValueError:
+            return
+
+        try:
+            self.model.model = torch.compile(
+                self.model.model, mode='reduce-overhead', fullgraph=False
+            )
+            logger.info("Compiled YOLO forward pass with TorchInductor")
+        except Exception as e:
+            logger.warning(f"torch.compile failed, using eager forward: {e}")
+
+    def _init_predictor(self):
+        """Build the predictor once and pre-allocate transfer buffers.
+
+        A dummy forward pass makes Ultralytics construct its predictor
+        up front; keeping it (plus MAX_BATCH-sized pinned host and
+        device tensors) alive across calls avoids per-request predictor
+        setup and CUDA allocator churn.
+        """
+        if not (TORCH_AVAILABLE and torch.cuda.is_available() and CV2_AVAILABLE):
+            return
+
+        try:
+            dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+            self.model.predict(dummy, imgsz=640, verbose=False)
+            self.predictor = self.model.predictor
+            self._host_pinned = torch.empty(
+                (MAX_BATCH, 3, 640, 640), dtype=torch.float16, pin_memory=True
+            )
+            self._dev_buf = torch.empty(
+                (MAX_BATCH, 3, 640, 640), dtype=torch.float16, device='cuda'
+            )
+        except Exception as e:
+            logger.warning(f"Could not pre-build predictor/buffers: {e}")
+            self.predictor = None
+            self._host_pinned = None
+            self._dev_buf = None
+
+    def _maybe_export_engine(self, model_path):
+        """Export the .pt weights to a TensorRT engine on CUDA hosts.
+
+        Precision follows AI_PRECISION: int8 (calibrated against the
+        images referenced by CALIB_DATA; TensorRT caches the calibration
+        table so later exports skip recalibration), fp16 (default), or
+        fp32 to keep the raw PyTorch weights. The export runs once; the
+        cached engine (named per precision and kept next to the weights,
+        so a persistent MODEL_PATH survives container restarts) is
+        reused on subsequent boots. CPU-only hosts keep the raw PyTorch
+        weights.
+        """
+        if not model_path.endswith('.pt'):
+            return model_path
+        if not (TORCH_AVAILABLE and torch.cuda.is_available()):
+            return model_path
+        if AI_PRECISION == 'fp32':
+            return model_path
+
+        use_int8 = AI_PRECISION == 'int8' and os.path.exists(CALIB_DATA)
+        if AI_PRECISION == 'int8' and not use_int8:
+            logger.warning(
+                f"AI_PRECISION=int8 but calibration data {CALIB_DATA} is "
+                f"missing, exporting FP16 instead"
+            )
+
+        precision = 'int8' if use_int8 else 'fp16'
+        # Precision-keyed cache name: without it a stale engine from a
+        # previous AI_PRECISION setting would be served silently.
+        engine_path = f"{model_path[:-len('.pt')]}.{precision}.engine"
+        if os.path.exists(engine_path):
+            return engine_path
+
+        export_kwargs = {
+            'format': 'engine',
+            'dynamic': True,
+            'batch': MAX_BATCH,
+            'imgsz': 640,
+            'workspace': 4,
+        }
+        if use_int8:
+            export_kwargs.update(int8=True, data=CALIB_DATA)
+        else:
+            export_kwargs.update(half=True)
+
+        try:
+            # Ultralytics writes '<stem>.engine'; move it to the
+            # precision-keyed name so fp16/int8 engines don't shadow
+            # each other.
+            exported = YOLO(model_path).export(**export_kwargs)
+            os.replace(exported, engine_path)
+            logger.info(
+                f"Exported TensorRT {precision.upper()} engine to {engine_path}"
+            )
+            return engine_path
+        except Exception as e:
+            logger.warning(f"TensorRT export failed, using PyTorch weights: {e}")
+            return model_path
+
+    def is_loaded(self):
+        """Whether the real model (vs. fallback heuristics) is in use."""
+        return self.model is not None
+
+    def _content_digest(self, image):
+        """Fast content hash of the image bytes, or None if unreadable."""
+        if isinstance(image, bytes):
+            data = image
+        else:
+            try:
+                with open(image, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return None
+        if XXHASH_AVAILABLE:
+            return xxhash.xxh3_64(data).hexdigest()
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _decode(self, image, flags=None):
+        """Decode a path or an in-memory buffer to a BGR array."""
+        if flags is None:
+            flags = cv2.IMREAD_COLOR
+        if isinstance(image, bytes):
+            return cv2.imdecode(np.frombuffer(image, np.uint8), flags)
+        return cv2.imread(image, flags)
+
+    def _cache_get(self, digest):
+        if digest is None:
+            return None
+        score = self._score_cache.get(digest)
+        if score is not None:
+            self._score_cache.move_to_end(digest)
+            return score
+        if self._disk_cache is not None:
+            return self._disk_cache.get(digest)
+        return None
+
+    def _cache_put(self, digest, score):
+        if digest is None:
+            return
+        self._score_cache[digest] = score
+        self._score_cache.move_to_end(digest)
+        while len(self._score_cache) > self._score_cache_size:
+            self._score_cache.popitem(last=False)
+        if self._disk_cache is not None:
+            try:
+                self._disk_cache.set(digest, score)
+            except Exception:
+                pass
+
+    def analyze(self, image):
+        """Analyze one image (path or in-memory bytes); returns 0-10."""
+        if self.model is None:
+            return self._fallback_scoring(image)
+
+        digest = self._content_digest(image)
+        cached = self._cache_get(digest)
+        if cached is not None:
+            return cached
+
+        try:
+            if self._batcher is not None:
+                # Singles also ride the micro-batcher, so they coalesce
+                # with whatever else is in flight.
+                score = self._batcher.submit(image).result()
+            else:
+                if isinstance(image, bytes):
+                    source = self._decode(image)
+                    # cv2.imdecode returns None for corrupt bytes, and
+                    # Ultralytics treats source=None as "use the bundled
+                    # sample assets" — which would cache a bogus score
+                    # under this upload's digest.
+                    if source is None:
+                        raise ValueError("Could not decode image")
+                else:
+                    source = image
+                results = self.model(source, verbose=False)
+                detected_objects = self._extract_detections(results[0])
+                score = self._calculate_severity(detected_objects)
+        except Exception as e:
+            logger.error(f"YOLO inference failed: {e}")
+            return self._fallback_scoring(image)
+
+        self._cache_put(digest, score)
+        return score
+
+    def analyze_batch(self, image_paths, batch=None):
+        """Analyze several images (paths or in-memory bytes) in one batch.
+
+        Passing the whole list to the model lets Ultralytics stack the
+        images into a single (N, 3, 640, 640) tensor, so the GPU pays
+        kernel-launch and setup costs once instead of once per image.
+        In-memory buffers skip the disk round-trip entirely. Returns the
+        maximum severity across the batch.
+        """
+        if not image_paths:
+            return 0.0
+
+        if self.model is None:
+            return max(self._fallback_scoring(p) for p in image_paths)
+
+        digests = [self._content_digest(p) for p in image_paths]
+        scores = [self._cache_get(d) for d in digests]
+        misses = [i for i, s in enumerate(scores) if s is None]
+        if not misses:
+            return max(scores)
+
+        miss_paths = [image_paths[i] for i in misses]
+        try:
+            if self._batcher is not None:
+                # Route through the micro-batcher so images from other
+                # concurrent requests share the same forward pass.
+                futures = [self._batcher.submit(img) for img in miss_paths]
+                miss_scores = [fut.result() for fut in futures]
+            else:
+                miss_scores = self._infer_scores(miss_paths, batch=batch)
+        except Exception as e:
+            logger.error(f"Batched YOLO inference failed: {e}")
+            return max(self._fallback_scoring(p) for p in image_paths)
+
+        for i, score in zip(misses, miss_scores):
+            scores[i] = score
+            self._cache_put(digests[i], score)
+        return max(scores) if scores else 0.0
+
+    def _infer_scores(self, images, batch=None):
+        """Run one batched forward pass and return per-image severities.
+
+        Serialized: _prepare_batch writes the shared pinned/device
+        buffers the predictor then reads, so a concurrent call could
+        overwrite one request's images with another's mid-flight. The
+        micro-batcher's single consumer never contends; the lock covers
+        the MICRO_BATCH=0 path.
+        """
+        with self._infer_lock:
+            batch_input = self._prepare_batch(images)
+            if self.predictor is not None and not isinstance(batch_input, list):
+                # Reuse the long-lived predictor: no per-call setup.
+                results = self.predictor(batch_input)
+            else:
+                results = self.model.predict(
+                    batch_input,
+                    verbose=False,
+                    batch=batch if batch is not None else len(images),
+                )
+        return [
+            self._calculate_severity(self._extract_detections(result))
+            for result in results
+        ]
+
+    def _prepare_batch(self, image_paths):
+        """Decode and preprocess images on CPU threads ahead of the GPU.
+
+        Letting Ultralytics read from paths would block the GPU on disk
+        I/O and per-image decode; instead the thread pool produces ready
+        NCHW tensors which are shipped to the device asynchronously from
+        pinned memory. Returns the original path list when the fast path
+        is unavailable so predict() falls back to path-based loading.
+        """
+        if not CV2_AVAILABLE:
+            return image_paths
+
+        try:
+            arrays = list(self._preproc_pool.map(self._preprocess_image, image_paths))
+            stacked = np.ascontiguousarray(np.stack(arrays))
+        except Exception as e:
+            logger.warning(f"Pipelined preprocessing failed, using paths: {e}")
+            return image_paths
+
+        if TORCH_AVAILABLE and torch.cuda.is_available():
+            # Already float16 NCHW contiguous: cuDNN's tensor-core
+            # kernels consume it directly with no hidden transpose.
+            n = stacked.shape[0]
+            if self._host_pinned is not None and n <= MAX_BATCH:
+                host = self._host_pinned[:n]
+                host.copy_(torch.from_numpy(stacked))
+                dev = self._dev_buf[:n]
+                dev.copy_(host, non_blocking=True)
+                return dev
+            tensor = torch.from_numpy(stacked)
+            return tensor.pin_memory().to('cuda', non_blocking=True)
+        if TORCH_AVAILABLE:
+            # FP16 is slow on CPU; widen before handing to the model.
+            return torch.from_numpy(stacked).float()
+        return image_paths
+
+    def _preprocess_image(self, image):
+        """Decode one image to a contiguous float16 NCHW (3, 640, 640) array."""
+        img = self._decode(image)
+        if img is None:
+            raise ValueError("Could not decode image")
+        img = cv2.resize(img, (640, 640))
+        img = img[:, :, ::-1].transpose(2, 0, 1)  # BGR -> RGB, HWC -> CHW
+        return np.ascontiguousarray(img, dtype=np.float16) / 255.0
+
+    def _extract_detections(self, result):
+        """Convert one Ultralytics result into a list of detection dicts."""
+        detected_objects = []
+        if result.boxes is None:
+            return detected_objects
+
+        for box in result.boxes:
+            class_id = int(box.cls[0])
+            detected_objects.append({
+                'class': result.names[class_id],
+                'confidence': float(box.conf[0]),
+            })
+        return detected_objects
+
+    def _calculate_severity(self, detected_objects):
+        """Map detected objects to a 0-10 severity score."""
+        if not detected_objects:
+            return 0.0
+
+        weights = self._class_weights
+        score = sum(
+            weights.get(obj['class'].lower(), 0.0) * obj['confidence']
+            for obj in detected_objects
+        )
+        return min(score, 10.0)
+
+    def _fallback_scoring(self, image):
+        """Cheap heuristic score used when YOLO is unavailable."""
+        try:
+            # File size is a cheap proxy for "real photo vs. screenshot"
+            # that needs no decoding at all (~2 MB ≈ a full-size photo).
+            if isinstance(image, bytes):
+                file_size = len(image)
+            else:
+                file_size = os.stat(image).st_size
+            size_factor = min(file_size / (2 * 1024 * 1024), 1.0)
+
+            # Lots of red often correlates with fire/blood in report media.
+            if CV2_AVAILABLE:
+                # Decode at 1/4 resolution inside the codec and use the
+                # SIMD-optimized channel mean (BGR: red is channel 2).
+                img = self._decode(image, cv2.IMREAD_REDUCED_COLOR_4)
+                if img is None:
+                    raise ValueError("Could not decode image")
+                red_factor = cv2.mean(img)[2] / 255.0
+            else:
+                import io
+                import numpy
+                from PIL import Image
+
+                src = io.BytesIO(image) if isinstance(image, bytes) else image
+                img = Image.open(src).convert('RGB')
+                red_factor = numpy.mean(numpy.array(img)[:, :, 0]) / 255.0
+
+            return min(red_factor * 5.0 + size_factor * 2.0, 10.0)
+        except Exception as e:
+            logger.error(f"Fallback image scoring failed: {e}")
+            return 0.0
@@ -0,0 +1,254 @@
+"""Spam detector for incoming reports.
+
+Combines a TF-IDF + XGBoost classifier (when the stack and a trained
+model are available) with keyword/shape heuristics and a similarity
+check against the user's recent report history.
+"""
+
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    ahocorasick = None
+    AHOCORASICK_AVAILABLE = False
+
+try:
+    from datasketch import MinHash
+    DATASKETCH_AVAILABLE = True
+except ImportError:
+    MinHash = None
+    DATASKETCH_AVAILABLE = False
+
+try:
+    import xgboost as xgb
+    from sklearn.feature_extraction.text import HashingVectorizer
+    XGB_AVAILABLE = True
+except ImportError:
+    xgb = None
+    HashingVectorizer = None
+    XGB_AVAILABLE = False
+
+try:
+    import numpy as np
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    np = None
+    njit = None
+    NUMBA_AVAILABLE = False
+
+# Matches any run of 5+ identical characters ("loooooool", "!!!!!").
+_REPEAT_RE = re.compile(r'(.)\1{4,}')
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _text_stats(data):
+        """One pass over UTF-8 bytes: (ASCII uppercase count, run-of-5 flag)."""
+        upper = 0
+        run = 1
+        has_run5 = False
+        prev = -1
+        for i in range(data.shape[0]):
+            b = data[i]
+            if 65 <= b <= 90:
+                upper += 1
+            if b == prev:
+                run += 1
+                if run >= 5:
+                    has_run5 = True
+            else:
+                run = 1
+                prev = b
+        return upper, has_run5
+
+# URL and HTML-tag stripping fused into one alternation so preprocessing
+# makes a single pass over the text instead of two.
+_URL_HTML_RE = re.compile(r'https?://\S+|www\.\S+|<.*?>')
+_WS_RE = re.compile(r'\s+')
+
+
+class SpamDetector:
+    """Flags reports that look like spam, pranks, or duplicates."""
+
+    def __init__(self):
+        self.model = None
+        self.vectorizer = None
+
+        self.spam_keywords = [
+            'free', 'win', 'winner', 'cash', 'prize', 'lottery', 'claim',
+            'urgent', 'click', 'subscribe', 'offer', 'discount', 'deal',
+            'buy now', 'limited time', 'act now', 'congratulations',
+            'selected', 'guaranteed', 'risk free', 'no cost', 'bonus',
+            'cheap', 'earn money', 'make money', 'work from home',
+            'investment', 'crypto', 'bitcoin', 'loan', 'credit',
+            'viagra', 'casino', 'betting', 'jackpot', 'lucky draw',
+            'whatsapp me', 'call now', 'dm me', 'follow me',
+        ]
+
+        # Single-pass Aho-Corasick automaton over the keyword list; one
+        # DFA walk of the text replaces one substring scan per keyword.
+        self._kw_automaton = None
+        if AHOCORASICK_AVAILABLE:
+            automaton = ahocorasick.Automaton()
+            for kw in self.spam_keywords:
+                automaton.add_word(kw, kw)
+            automaton.make_automaton()
+            self._kw_automaton = automaton
+
+        # MinHash signatures keyed by text hash, so each history entry is
+        # summarized once and later duplicate checks compare 128-int
+        # signatures instead of rebuilding full word sets.
+        self._minhash_cache = {}
+        self._minhash_cache_size = 4096
+
+        self._load_model()
+
+    def _load_model(self):
+        """Load the trained spam classifier, if the stack is available."""
+        if not XGB_AVAILABLE:
+            logger.warning("xgboost/sklearn not available, using fallback spam scoring")
+            return
+
+        try:
+            # Stateless hashing: no vocabulary fit needed before the
+            # first transform, and memory stays bounded.
+            self.vectorizer = HashingVectorizer(
+                n_features=2 ** 18, alternate_sign=False, ngram_range=(1, 2)
+            )
+            model_file = os.environ.get('SPAM_MODEL_PATH', 'models/spam_xgb.bin')
+            if os.path.exists(model_file):
+                booster = xgb.Booster()
+                booster.load_model(model_file)
+                self.model = booster
+                logger.info(f"Loaded spam booster from {model_file}")
+            else:
+                logger.warning(
+                    f"No trained spam booster at {model_file}, using heuristics"
+                )
+        except Exception as e:
+            logger.error(f"Failed to initialize spam classifier: {e}")
+            self.model = None
+            self.vectorizer = None
+
+    def is_loaded(self):
+        """Whether the trained classifier (vs. heuristics) is in use."""
+        return self.model is not None
+
+    def predict(self, text, report_history=None):
+        """Return a spam probability in [0, 1] for the report text."""
+        if not text:
+            return 0.0
+
+        processed = self._preprocess_text(text)
+
+        if self.model is not None:
+            try:
+                X = self.vectorizer.transform([processed])
+                p = float(self.model.predict(xgb.DMatrix(X))[0])
+                return min(max(p, 0.0), 1.0)
+            except Exception as e:
+                logger.error(f"Spam booster inference failed: {e}")
+
+        return self._fallback_scoring(processed, text, report_history or [])
+
+    def _preprocess_text(self, text):
+        """Lowercase and strip URLs, HTML tags, and extra whitespace."""
+        return _WS_RE.sub(' ', _URL_HTML_RE.sub('', text.lower())).strip()
+
+    def _count_keyword_hits(self, text_lower):
+        """Count spam-keyword occurrences in a single pass."""
+        if self._kw_automaton is not None:
+            return sum(1 for _ in self._kw_automaton.iter(text_lower))
+        return sum(1 for keyword in self.spam_keywords if keyword in text_lower)
+
+    def _fallback_scoring(self, text, raw_text, report_history):
+        """Heuristic spam score when no trained classifier is available.
+
+        ``text`` is the preprocessed (lowercased) form; ``raw_text`` is
+        the original, which the shape heuristics need — casing is gone
+        after preprocessing.
+        """
+        score = 0.0
+        text_lower = text
+
+        # Spam keyword density.
+        keyword_hits = self._count_keyword_hits(text_lower)
+        score += min(keyword_hits * 0.15, 0.5)
+
+        # Shouting (high uppercase ratio) and keyboard mashing (runs of
+        # 5+ identical characters), both from one pass over the text.
+        caps_ratio, has_run5 = self._shape_stats(raw_text)
+        if len(raw_text) > 10 and caps_ratio > 0.5:
+            score += 0.2
+        if has_run5:
+            score += 0.15
+
+        # Near-duplicate of a recent report from the same user.
+        if self._is_duplicate(text_lower, report_history):
+            score += 0.3
+
+        return min(score, 1.0)
+
+    def _shape_stats(self, text):
+        """(uppercase ratio, has a run of 5+ identical chars) for the text.
+
+        With numba installed both stats come from a single jitted pass
+        over the UTF-8 bytes instead of per-character Python loops (the
+        uppercase count is then ASCII-only, which is what the shouting
+        heuristic cares about anyway).
+        """
+        if not text:
+            return 0.0, False
+
+        if NUMBA_AVAILABLE:
+            data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+            upper, has_run5 = _text_stats(data)
+            return upper / len(text), has_run5
+
+        caps_ratio = sum(1 for c in text if c.isupper()) / len(text)
+        return caps_ratio, _REPEAT_RE.search(text) is not None
+
+    def _is_duplicate(self, text_lower, report_history):
+        """Whether the text is a near-duplicate of any history entry."""
+        if not report_history:
+            return False
+
+        if DATASKETCH_AVAILABLE:
+            query = self._minhash(text_lower)
+            return any(
+                query.jaccard(self._minhash(previous.lower())) > 0.8
+                for previous in report_history
+            )
+
+        return any(
+            self._similarity(text_lower, previous.lower()) > 0.8
+            for previous in report_history
+        )
+
+    def _minhash(self, text):
+        """128-permutation MinHash of the text's word tokens, cached."""
+        key = hash(text)
+        cached = self._minhash_cache.get(key)
+        if cached is not None:
+            return cached
+
+        m = MinHash(num_perm=128)
+        for token in set(text.split()):
+            m.update(token.encode('utf-8'))
+        if len(self._minhash_cache) < self._minhash_cache_size:
+            self._minhash_cache[key] = m
+        return m
+
+    def _similarity(self, text_a, text_b):
+        """Jaccard similarity over word sets."""
+        words_a = set(text_a.split())
+        words_b = set(text_b.split())
+        if not words_a or not words_b:
+            return 0.0
+        return len(words_a & words_b) / len(words_a | words_b)
@@ -0,0 +1,200 @@
+"""Flask service that scores incoming reports for spam and severity.
+
+Development: ``python app.py`` runs the built-in server.
+Production: ``gunicorn -c gunicorn_conf.py app:app`` — gevent workers so
+file I/O and model calls overlap instead of blocking the whole process.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, jsonify, request
+from werkzeug.utils import secure_filename
+
+from ai_models import ImageAnalyzer, SpamDetector, TextAnalyzer
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+
+_ALLOWED_EXT = frozenset({'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov'})
+
+# Keep writing uploads to UPLOAD_FOLDER (asynchronously) for auditing.
+AUDIT_UPLOADS = os.environ.get('AUDIT_UPLOADS', '1') != '0'
+
+app = Flask(__name__)
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024  # 20 MB per upload
+
+text_analyzer = None
+image_analyzer = None
+spam_detector = None
+
+# Runs independent analyses concurrently: text inference and media
+# inference don't depend on each other, so the endpoint's wall-clock is
+# max(text, media) instead of their sum.
+analysis_pool = ThreadPoolExecutor(max_workers=4)
+
+
+# Set once the warmup thread has finished loading every model; /analyze
+# returns 503 until then so /health stays responsive during cold start.
+_models_ready = threading.Event()
+_warmup_lock = threading.Lock()
+_warmup_thread = None
+
+
+def init_models():
+    """Build the analyzers synchronously (development / test path)."""
+    global text_analyzer, image_analyzer, spam_detector
+    if _models_ready.is_set():
+        return
+
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    try:
+        spam_detector = SpamDetector()
+        text_analyzer = TextAnalyzer()
+        text_analyzer.ensure_loaded()  # lazy by default; warm it here
+        image_analyzer = ImageAnalyzer()
+        logger.info("All models initialized")
+        _models_ready.set()
+    except Exception as e:
+        logger.error(f"Model initialization failed: {e}")
+        raise
+
+
+def start_warmup():
+    """Load the models on a background thread.
+
+    Called from the gunicorn post_fork hook so each worker loads the
+    models into its own process (and GPU context) without blocking
+    /health, and from __main__ for the development server.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=init_models, daemon=True)
+            _warmup_thread.start()
+
+
+def _json_loads(data):
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+
+def _json_dumps(payload):
+    """Serialize to bytes with orjson when available.
+
+    orjson handles NumPy scalars natively, so the analyzers' scores need
+    no float() casts before serialization; the stdlib fallback coerces
+    them via default=float.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=float).encode()
+
+
+def _json_response(body):
+    return app.response_class(body, mimetype='application/json')
+
+
+def allowed_file(filename):
+    """Whether the upload's extension is one we accept."""
+    _, sep, ext = filename.rpartition('.')
+    return bool(sep) and ext.lower() in _ALLOWED_EXT
+
+
+def save_uploaded_file(file):
+    """Read one upload into memory; returns (filename, bytes) or None.
+
+    The analyzers consume the bytes directly, so the request path no
+    longer writes (and immediately re-reads) up to 20 MB per file.
+    Disk persistence happens asynchronously, for auditing only.
+    """
+    if not file or not file.filename or not allowed_file(file.filename):
+        return None
+    return secure_filename(file.filename), file.stream.read()
+
+
+def _persist_upload(filename, buf):
+    """Write an upload to UPLOAD_FOLDER for auditing (off the hot path)."""
+    try:
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        with open(file_path, 'wb') as dst:
+            dst.write(buf)
+    except OSError as e:
+        logger.error(f"Could not persist upload {filename}: {e}")
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({
+        'status': 'ok',
+        'ready': _models_ready.is_set(),
+        'models': {
+            'text': text_analyzer is not None and text_analyzer.is_loaded(),
+            'image': image_analyzer is not None and image_analyzer.is_loaded(),
+            'spam': spam_detector is not None and spam_detector.is_loaded(),
+        },
+    })
+
+
+@app.route('/analyze', methods=['POST'])
+def analyze_report():
+    if not _models_ready.is_set():
+        start_warmup()
+        return jsonify({'error': 'models warming up, retry shortly'}), 503
+
+    text = request.form.get('text', '')
+    try:
+        report_history = _json_loads(request.form.get('report_history') or '[]')
+    except (ValueError, TypeError):
+        report_history = []
+
+    spam_probability = spam_detector.predict(text, report_history)
+
+    media_items = []
+    for file in request.files.getlist('media'):
+        saved = save_uploaded_file(file)
+        if saved:
+            media_items.append(saved)
+
+    fut_text = analysis_pool.submit(text_analyzer.analyze, text)
+    fut_media = (
+        analysis_pool.submit(
+            image_analyzer.analyze_batch, [buf for _, buf in media_items]
+        )
+        if media_items else None
+    )
+    if AUDIT_UPLOADS:
+        for filename, buf in media_items:
+            analysis_pool.submit(_persist_upload, filename, buf)
+    text_severity = fut_text.result()
+    media_severity = fut_media.result() if fut_media is not None else 0.0
+
+    severity = max(text_severity, media_severity)
+    response = {
+        'spam_probability': spam_probability,
+        'is_spam': spam_probability > 0.5,
+        'text_severity': text_severity,
+        'media_severity': media_severity,
+        'severity': severity,
+        'media_count': len(media_items),
+    }
+    body = _json_dumps(response)
+    logger.info("Analyzed report: %s", body.decode())
+    return _json_response(body)
+
+
+if __name__ == '__main__':
+    start_warmup()
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,19 @@
+"""Gunicorn configuration: ``gunicorn -c gunicorn_conf.py app:app``.
+
+gevent workers keep the process responsive during file writes and model
+calls; the dev server handled one request at a time.
+"""
+
+import multiprocessing
+
+bind = '0.0.0.0:5000'
+worker_class = 'gevent'
+workers = 2 * multiprocessing.cpu_count() + 1
+worker_connections = 1000
+timeout = 120
+
+
+def post_fork(server, worker):
+    """Warm the models after the fork so each worker owns its GPU context."""
+    import app
+    app.start_warmup()